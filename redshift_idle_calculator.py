@@ -29,28 +29,204 @@ Redshift空闲时间计算器
 """
 
 import argparse
+import functools
+import os
+import re
 import sys
+import tempfile
 import time
 import json
+import types
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import boto3
+import jmespath
+from botocore.config import Config
+import numpy as np
 from botocore.exceptions import ClientError, NoCredentialsError
 
+# 可选依赖：安装orjson时用于缓存文件的读写，否则使用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # 版本信息
 __version__ = "1.0.0"
 __author__ = "Redshift Cost Optimizer"
 
 # 数据结构定义
 MetricPoint = namedtuple('MetricPoint', ['timestamp', 'value'])
+# 单个指标的时间序列：timestamps为UTC datetime64[s]数组，values为数值数组（CloudWatch数据为float64），按时间升序
+MetricSeries = namedtuple('MetricSeries', ['timestamps', 'values'])
+PriceInfo = namedtuple('PriceInfo', ['price', 'currency', 'source'])
+
+# 判断活跃状态的指标，任一指标大于0即视为活跃 - 只关注真正的业务活动指标
+# 网络流量不作为判断依据，因为系统维护、监控等会产生持续的基础网络流量
+ACTIVITY_METRICS = ('ReadIOPS', 'WriteIOPS', 'DatabaseConnections')
+
+# Metric Math在服务端合并得到的活跃标记序列名称（1=活跃，0=空闲）
+ACTIVITY_SERIES_NAME = 'Activity'
+
+# GetMetricData单次请求最多返回的数据点数
+GET_METRIC_DATA_MAX_DATAPOINTS = 100800
+
+# 月度成本按30天计算
+HOURS_PER_MONTH = 24 * 30
+
+# 区域代码到Pricing API位置名称的映射
+_REGION_TO_LOCATION = {
+    'us-east-1': 'US East (N. Virginia)',
+    'us-west-2': 'US West (Oregon)',
+    'eu-west-1': 'Europe (Ireland)',
+    'ap-southeast-1': 'Asia Pacific (Singapore)',
+    'cn-north-1': 'China (Beijing)',
+    'cn-northwest-1': 'China (Ningxia)',
+}
+
+# RPU价格备用表
+_FALLBACK_RPU = types.MappingProxyType({
+    'cn-north-1': PriceInfo(2.692, 'CNY', 'hardcoded'),
+    'cn-northwest-1': PriceInfo(2.093, 'CNY', 'hardcoded'),
+    'us-east-1': PriceInfo(0.375, 'USD', 'hardcoded'),
+    'us-west-2': PriceInfo(0.375, 'USD', 'hardcoded'),
+    'eu-west-1': PriceInfo(0.375, 'USD', 'hardcoded'),
+    'ap-southeast-1': PriceInfo(0.45, 'USD', 'hardcoded'),
+})
+_DEFAULT_RPU_PRICE = PriceInfo(0.375, 'USD', 'default')
+
+# 实例价格备用表（每节点每小时）
+_FALLBACK_INSTANCE_CN = {
+    'dc2.large': 2.145, 'dc2.8xlarge': 41.60,
+    'ra3.large': 3.475, 'ra3.xlplus': 6.950,
+    'ra3.4xlarge': 20.864, 'ra3.16xlarge': 83.456,
+}
+
+_FALLBACK_INSTANCE_US = {
+    'dc2.large': 0.25, 'dc2.8xlarge': 4.80,
+    'ra3.large': 0.48, 'ra3.xlplus': 1.086,
+    'ra3.4xlarge': 3.26, 'ra3.16xlarge': 13.04,
+}
+
+# 按(区域类别, 实例类型)索引的实例备用价格，区域类别为'cn'或'global'
+_FALLBACK_INSTANCE = types.MappingProxyType({
+    **{('cn', node_type): PriceInfo(price, 'CNY', 'hardcoded')
+       for node_type, price in _FALLBACK_INSTANCE_CN.items()},
+    **{('global', node_type): PriceInfo(price, 'USD', 'hardcoded')
+       for node_type, price in _FALLBACK_INSTANCE_US.items()},
+})
+_ERROR_PRICE = PriceInfo(0.0, 'USD', 'error')
+
+def to_metric_series(timestamps: List[datetime], values: List[float], 
+                     resolution_seconds: int = 1) -> MetricSeries:
+    """
+    将时间戳和数值列表转换为按时间排序的MetricSeries
+    
+    Args:
+        timestamps: 时间戳列表（带时区的时间按UTC处理，无时区的时间视为UTC）
+        values: 与时间戳一一对应的指标值
+        resolution_seconds: 时间戳向下取整的粒度（秒），按采样间隔取整后各指标的时间点可以精确对齐
+        
+    Returns:
+        MetricSeries
+    """
+    # 经由epoch秒数转换，避免为每个数据点创建中间datetime对象
+    epoch_seconds = np.fromiter(
+        ((ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).timestamp() for ts in timestamps),
+        dtype=np.float64, count=len(timestamps)
+    )
+    epoch_seconds = np.floor(epoch_seconds).astype(np.int64)
+    if resolution_seconds > 1:
+        epoch_seconds -= epoch_seconds % resolution_seconds
+    ts_array = epoch_seconds.astype('datetime64[s]')
+    value_array = np.asarray(values, dtype=np.float64)
+    order = np.argsort(ts_array, kind='stable')
+    return MetricSeries(ts_array[order], value_array[order])
+
+def concat_metric_series(series_list: List[MetricSeries]) -> MetricSeries:
+    """合并多个MetricSeries并按时间重新排序"""
+    series_list = [series for series in series_list if series.timestamps.size]
+    if not series_list:
+        return to_metric_series([], [])
+    # 各分批窗口互不重叠且内部已排序，按起始时间排列后直接拼接即为有序结果
+    series_list.sort(key=lambda series: series.timestamps[0])
+    ts_array = np.concatenate([series.timestamps for series in series_list])
+    value_array = np.concatenate([series.values for series in series_list])
+    if np.all(ts_array[1:] >= ts_array[:-1]):
+        return MetricSeries(ts_array, value_array)
+    order = np.argsort(ts_array, kind='stable')
+    return MetricSeries(ts_array[order], value_array[order])
+
+def to_datetime(timestamp: np.datetime64) -> datetime:
+    """将UTC datetime64转换为带时区的datetime"""
+    return timestamp.astype('datetime64[s]').item().replace(tzinfo=timezone.utc)
+
+# 预编译的价格维度提取表达式，按(计费条款, 计价单位)从产品JSON中筛选priceDimensions
+_PRICE_DIMENSION_EXPRS = {
+    (terms_key, unit): jmespath.compile(
+        f"values(terms.{terms_key} || `{{}}`)[].values(priceDimensions || `{{}}`)[] | [?unit=='{unit}']"
+    )
+    for terms_key in ('OnDemand', 'Reserved')
+    for unit in ('RPU-Hr', 'Hrs')
+}
+
+# Pricing API最多检查的产品数量
+_PRICING_MAX_ITEMS = 50
+
+# 价格磁盘缓存（跨进程复用Pricing API结果）
+_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'redshift-idle-analyzer')
+_PRICE_CACHE_FILE = os.path.join(_CACHE_DIR, 'prices.json')
+_PRICE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# 共享的boto3会话，避免每次创建客户端时重复解析凭证和配置文件
+_SESSION = boto3.session.Session()
+
+# 价格查询使用的快速失败配置，避免网络或端点异常时长时间阻塞
+_FAST_FAIL_CONFIG = Config(connect_timeout=2, read_timeout=3, retries={'max_attempts': 1})
+
+# CloudWatch使用botocore自适应重试，由客户端令牌桶限速处理限流和退避
+_CLOUDWATCH_CONFIG = Config(retries={'max_attempts': 10, 'mode': 'adaptive'})
+
+# 为True时跳过Pricing API，直接使用备用价格
+_pricing_offline = False
+
+@functools.lru_cache(maxsize=None)
+def _client(service: str, region: str, config: Optional[Config] = None):
+    """按(服务, 区域, 配置)缓存boto3客户端，复用端点解析结果和HTTPS连接池"""
+    return _SESSION.client(service, region_name=region, config=config)
+
+@functools.lru_cache(maxsize=None)
+def _pricing_api_available(region: str) -> bool:
+    """
+    检查是否可以调用Pricing API（离线模式或凭证不可用时返回False），结果按区域缓存
+    
+    凭证检查复用_get_caller_identity按分析区域缓存的结果，凭证验证阶段已调用过时不再发起STS请求。
+    """
+    if _pricing_offline:
+        return False
+    try:
+        _get_caller_identity(region)
+        return True
+    except Exception:
+        return False
+
+def set_pricing_offline(offline: bool) -> None:
+    """设置是否跳过Pricing API，只使用备用价格"""
+    global _pricing_offline
+    _pricing_offline = offline
+    _pricing_api_available.cache_clear()
+    _lookup_redshift_price.cache_clear()
 
 def get_redshift_price_dynamic(region: str, price_type: str = 'rpu', instance_type: str = None, 
                               term_type: str = 'on_demand') -> Dict[str, Any]:
     """
     通用的Redshift价格查询函数，支持RPU和实例价格查询
     
+    同一进程内相同参数的查询结果会被缓存，避免重复调用Pricing API。
+    
     Args:
         region: AWS区域
         price_type: 价格类型 ('rpu' 或 'instance')
@@ -60,6 +236,13 @@ def get_redshift_price_dynamic(region: str, price_type: str = 'rpu', instance_ty
     Returns:
         价格信息字典，包含price, currency, source等字段
     """
+    # 返回副本，调用方修改结果不会污染缓存
+    return dict(_lookup_redshift_price(region, price_type, instance_type, term_type)._asdict())
+
+@functools.lru_cache(maxsize=32)
+def _lookup_redshift_price(region: str, price_type: str, instance_type: Optional[str], 
+                           term_type: str) -> PriceInfo:
+    """查询价格（API优先，失败时使用备用价格），结果按参数缓存"""
     def get_pricing_api_region(region: str) -> str:
         """确定Pricing API区域"""
         if region.startswith('cn-'):
@@ -67,21 +250,9 @@ def get_redshift_price_dynamic(region: str, price_type: str = 'rpu', instance_ty
         else:
             return 'us-east-1'  # Global区域的Pricing API
     
-    def get_location_name(region: str) -> str:
-        """区域代码转换为位置名称"""
-        region_mapping = {
-            'us-east-1': 'US East (N. Virginia)',
-            'us-west-2': 'US West (Oregon)',
-            'eu-west-1': 'Europe (Ireland)',
-            'ap-southeast-1': 'Asia Pacific (Singapore)',
-            'cn-north-1': 'China (Beijing)',
-            'cn-northwest-1': 'China (Ningxia)',
-        }
-        return region_mapping.get(region, region)
-    
     def build_filters(region: str, price_type: str, instance_type: str = None) -> List[Dict]:
         """构建API查询过滤器"""
-        location = get_location_name(region)
+        location = _REGION_TO_LOCATION.get(region, region)
         filters = [
             {'Type': 'TERM_MATCH', 'Field': 'location', 'Value': location}
         ]
@@ -121,32 +292,35 @@ def get_redshift_price_dynamic(region: str, price_type: str = 'rpu', instance_ty
                        term_type: str = 'on_demand') -> Optional[Dict]:
         """使用API查询价格"""
         try:
+            if not _pricing_api_available(region):
+                return None
             pricing_region = get_pricing_api_region(region)
-            pricing_client = boto3.client('pricing', region_name=pricing_region)
+            pricing_client = _client('pricing', pricing_region, _FAST_FAIL_CONFIG)
             filters = build_filters(region, price_type, instance_type)
             
-            response = pricing_client.get_products(
+            # 选择正确的计费条款和计价单位
+            terms_key = 'OnDemand' if term_type == 'on_demand' else 'Reserved'
+            unit = 'RPU-Hr' if price_type == 'rpu' else 'Hrs'
+            dimensions_expr = _PRICE_DIMENSION_EXPRS[(terms_key, unit)]
+            
+            # 使用分页器，确保按需SKU不在第一页时也能找到
+            paginator = pricing_client.get_paginator('get_products')
+            pages = paginator.paginate(
                 ServiceCode='AmazonRedshift',
                 Filters=filters,
-                MaxResults=10
+                PaginationConfig={'MaxItems': _PRICING_MAX_ITEMS, 'PageSize': 10}
             )
             
-            for product_str in response.get('PriceList', []):
-                product = json.loads(product_str)
-                attributes = product.get('product', {}).get('attributes', {})
-                payment_option = attributes.get('paymentOption', '')
-                
-                # 选择正确的计费条款
-                terms_key = 'OnDemand' if term_type == 'on_demand' else 'Reserved'
-                terms = product.get('terms', {}).get(terms_key, {})
-                
-                for term_key, term_value in terms.items():
-                    price_dimensions = term_value.get('priceDimensions', {})
-                    for price_key, price_value in price_dimensions.items():
+            for page in pages:
+                for product_str in page.get('PriceList', []):
+                    product = json.loads(product_str)
+                    payment_option = product.get('product', {}).get('attributes', {}).get('paymentOption', '')
+                    
+                    for price_value in dimensions_expr.search(product) or []:
                         price_per_unit = price_value.get('pricePerUnit', {})
                         
                         if price_per_unit and is_target_pricing(price_value, price_type, term_type):
-                            currency = list(price_per_unit.keys())[0]
+                            currency = next(iter(price_per_unit))
                             price = float(price_per_unit[currency])
                             
                             # 对于按需定价，进一步验证
@@ -164,64 +338,86 @@ def get_redshift_price_dynamic(region: str, price_type: str = 'rpu', instance_ty
         except Exception:
             return None
     
-    def get_fallback_price(region: str, price_type: str, instance_type: str = None) -> Dict:
+    def get_fallback_price(region: str, price_type: str, instance_type: str = None) -> PriceInfo:
         """获取备用硬编码价格"""
         if price_type == 'rpu':
-            # RPU价格备用表
-            fallback_prices = {
-                'cn-north-1': {'price': 2.692, 'currency': 'CNY'},
-                'cn-northwest-1': {'price': 2.093, 'currency': 'CNY'},
-                'us-east-1': {'price': 0.375, 'currency': 'USD'},
-                'us-west-2': {'price': 0.375, 'currency': 'USD'},
-                'eu-west-1': {'price': 0.375, 'currency': 'USD'},
-                'ap-southeast-1': {'price': 0.45, 'currency': 'USD'},
-            }
-            
-            if region in fallback_prices:
-                data = fallback_prices[region]
-                return {'price': data['price'], 'currency': data['currency'], 'source': 'hardcoded'}
-            else:
-                return {'price': 0.375, 'currency': 'USD', 'source': 'default'}
+            return _FALLBACK_RPU.get(region, _DEFAULT_RPU_PRICE)
         
         elif price_type == 'instance':
-            # 实例价格备用表
-            cn_pricing_table = {
-                'dc2.large': 2.145, 'dc2.8xlarge': 41.60,
-                'ra3.large': 3.475, 'ra3.xlplus': 6.950,
-                'ra3.4xlarge': 20.864, 'ra3.16xlarge': 83.456,
-            }
-            
-            us_pricing_table = {
-                'dc2.large': 0.25, 'dc2.8xlarge': 4.80,
-                'ra3.large': 0.48, 'ra3.xlplus': 1.086,
-                'ra3.4xlarge': 3.26, 'ra3.16xlarge': 13.04,
-            }
-            
-            if region.startswith('cn-'):
-                pricing_table = cn_pricing_table
-                currency = 'CNY'
-            else:
-                pricing_table = us_pricing_table
-                currency = 'USD'
-            
-            if instance_type in pricing_table:
-                price = pricing_table[instance_type]
-            else:
-                # 未知实例类型使用ra3.xlplus价格
-                price = pricing_table.get('ra3.xlplus', 6.950 if region.startswith('cn-') else 1.086)
-            
-            return {'price': price, 'currency': currency, 'source': 'hardcoded'}
+            region_group = 'cn' if region.startswith('cn-') else 'global'
+            # 未知实例类型使用ra3.xlplus价格
+            return _FALLBACK_INSTANCE.get((region_group, instance_type),
+                                          _FALLBACK_INSTANCE[(region_group, 'ra3.xlplus')])
         
         # 默认返回
-        return {'price': 0.0, 'currency': 'USD', 'source': 'error'}
+        return _ERROR_PRICE
+    
+    # 离线模式直接使用备用价格，不读取缓存
+    if _pricing_offline:
+        return get_fallback_price(region, price_type, instance_type)
+    
+    # 优先使用磁盘缓存，其次尝试API查询
+    cache_key = '|'.join([region, price_type, instance_type or '', term_type])
+    cached = _read_price_cache(cache_key)
+    if cached:
+        return cached
     
-    # 首先尝试API查询
     api_result = query_api_price(region, price_type, instance_type, term_type)
     if api_result:
-        return api_result
+        price_info = PriceInfo(**api_result)
+        # 只缓存API价格，备用价格不落盘，避免临时故障导致长期使用硬编码价格
+        _write_price_cache(cache_key, price_info)
+        return price_info
     else:
         return get_fallback_price(region, price_type, instance_type)
 
+def _load_price_cache() -> Dict[str, Any]:
+    """读取价格缓存文件，文件不存在或损坏时返回空字典"""
+    try:
+        with open(_PRICE_CACHE_FILE, 'rb') as f:
+            data = f.read()
+        cache = orjson.loads(data) if orjson else json.loads(data)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _read_price_cache(cache_key: str) -> Optional[PriceInfo]:
+    """获取未过期的缓存价格"""
+    entry = _load_price_cache().get(cache_key)
+    if not isinstance(entry, dict) or entry.get('expires', 0) < time.time():
+        return None
+    try:
+        return PriceInfo(float(entry['price']), entry['currency'], 'cache')
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _write_price_cache(cache_key: str, price_info: PriceInfo) -> None:
+    """写入价格缓存，写入失败时静默忽略（缓存不影响功能）"""
+    cache = _load_price_cache()
+    cache[cache_key] = {
+        'price': price_info.price,
+        'currency': price_info.currency,
+        'expires': time.time() + _PRICE_CACHE_TTL_SECONDS
+    }
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        tmp_file = f"{_PRICE_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(cache) if orjson else json.dumps(cache).encode('utf-8'))
+        os.replace(tmp_file, _PRICE_CACHE_FILE)
+    except OSError:
+        pass
+
+def clear_price_cache() -> None:
+    """清除价格缓存（内存和磁盘），下次查询将重新调用Pricing API"""
+    _lookup_redshift_price.cache_clear()
+    try:
+        os.remove(_PRICE_CACHE_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️  无法清除价格缓存: {e}")
+
 # 为了向后兼容，保留原来的函数名
 def get_rpu_price_dynamic(region: str) -> Dict[str, Any]:
     """RPU价格查询的兼容函数"""
@@ -231,6 +427,16 @@ def get_instance_price_dynamic(node_type: str, region: str) -> Dict[str, Any]:
     """实例价格查询的兼容函数"""
     return get_redshift_price_dynamic(region, 'instance', node_type)
 
+# 常见AWS区域及区域格式（如 us-east-1、cn-northwest-1、us-gov-west-1）
+_KNOWN_REGIONS = frozenset([
+    'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2',
+    'eu-west-1', 'eu-west-2', 'eu-west-3', 'eu-central-1',
+    'ap-southeast-1', 'ap-southeast-2', 'ap-northeast-1', 'ap-northeast-2',
+    'cn-north-1', 'cn-northwest-1',  # 中国区域
+    'ca-central-1', 'sa-east-1'
+])
+_REGION_RE = re.compile(r'^[a-z]+(?:-[a-z]+)+-\d+$')
+
 def validate_inputs(cluster_id: str, region: str, days: int) -> None:
     """
     验证输入参数
@@ -256,19 +462,9 @@ def validate_inputs(cluster_id: str, region: str, days: int) -> None:
     if not region or not region.strip():
         raise ValueError("区域不能为空")
     
-    # 基本的区域格式验证
-    valid_region_patterns = [
-        'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2',
-        'eu-west-1', 'eu-west-2', 'eu-west-3', 'eu-central-1',
-        'ap-southeast-1', 'ap-southeast-2', 'ap-northeast-1', 'ap-northeast-2',
-        'cn-north-1', 'cn-northwest-1',  # 中国区域
-        'ca-central-1', 'sa-east-1'
-    ]
-    
     region = region.strip()
     # 简单的区域格式检查（允许自定义区域）
-    if not (region in valid_region_patterns or 
-            (len(region.split('-')) >= 3 and region.replace('-', '').replace('1', '').replace('2', '').replace('3', '').isalpha())):
+    if region not in _KNOWN_REGIONS and not _REGION_RE.match(region):
         print(f"⚠️  警告: 区域 '{region}' 可能不是有效的AWS区域")
     
     # 验证天数
@@ -283,6 +479,25 @@ def validate_inputs(cluster_id: str, region: str, days: int) -> None:
     
     print(f"✓ 输入验证通过: 集群={cluster_id}, 区域={region}, 天数={days}")
 
+@functools.lru_cache(maxsize=16)
+def _get_caller_identity(region: str) -> Dict[str, Any]:
+    """获取调用者身份，同一进程内按区域缓存（失败不缓存）"""
+    return _client('sts', region).get_caller_identity()
+
+@functools.lru_cache(maxsize=16)
+def _describe_cluster(cluster_id: str, region: str) -> Dict[str, Any]:
+    """获取describe_clusters响应，同一进程内按(集群, 区域)缓存（失败不缓存）"""
+    return _client('redshift', region).describe_clusters(ClusterIdentifier=cluster_id)
+
+def _print_identity(response: Dict[str, Any]) -> None:
+    """输出调用者身份信息"""
+    account_id = response.get('Account', 'unknown')
+    user_arn = response.get('Arn', 'unknown')
+    
+    print(f"✓ AWS凭证验证通过")
+    print(f"   账户ID: {account_id}")
+    print(f"   用户ARN: {user_arn}")
+
 def validate_aws_credentials(region: str) -> bool:
     """
     验证AWS凭证是否有效
@@ -295,16 +510,7 @@ def validate_aws_credentials(region: str) -> bool:
     """
     try:
         # 尝试获取调用者身份
-        sts = boto3.client('sts', region_name=region)
-        response = sts.get_caller_identity()
-        
-        account_id = response.get('Account', 'unknown')
-        user_arn = response.get('Arn', 'unknown')
-        
-        print(f"✓ AWS凭证验证通过")
-        print(f"   账户ID: {account_id}")
-        print(f"   用户ARN: {user_arn}")
-        
+        _print_identity(_get_caller_identity(region))
         return True
         
     except NoCredentialsError:
@@ -341,8 +547,7 @@ def validate_cluster_access(cluster_id: str, region: str) -> bool:
         True如果能访问，False否则
     """
     try:
-        redshift = boto3.client('redshift', region_name=region)
-        response = redshift.describe_clusters(ClusterIdentifier=cluster_id)
+        response = _describe_cluster(cluster_id, region)
         
         if not response['Clusters']:
             print(f"❌ 未找到集群: {cluster_id}")
@@ -387,20 +592,17 @@ def validate_cloudwatch_permissions(cluster_id: str, region: str) -> bool:
         True如果权限足够，False否则
     """
     try:
-        cloudwatch = boto3.client('cloudwatch', region_name=region)
+        cloudwatch = _client('cloudwatch', region, _CLOUDWATCH_CONFIG)
         
-        # 尝试获取一个简单的指标来测试权限
+        # 用最小的请求测试权限：单个指标、单个采样周期、最多返回1个数据点
         end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(hours=1)
+        start_time = end_time - timedelta(minutes=5)
         
-        response = cloudwatch.get_metric_statistics(
-            Namespace='AWS/Redshift',
-            MetricName='DatabaseConnections',
-            Dimensions=[{'Name': 'ClusterIdentifier', 'Value': cluster_id}],
+        cloudwatch.get_metric_data(
+            MetricDataQueries=build_metric_data_queries(cluster_id, ['DatabaseConnections'], 300),
             StartTime=start_time,
             EndTime=end_time,
-            Period=300,
-            Statistics=['Average']
+            MaxDatapoints=1
         )
         
         print(f"✓ CloudWatch权限验证通过")
@@ -410,7 +612,7 @@ def validate_cloudwatch_permissions(cluster_id: str, region: str) -> bool:
         error_code = e.response['Error']['Code']
         if error_code == 'AccessDenied':
             print(f"❌ CloudWatch权限不足")
-            print("   请确保具有 cloudwatch:GetMetricStatistics 权限")
+            print("   请确保具有 cloudwatch:GetMetricData 权限")
         else:
             print(f"❌ CloudWatch权限验证失败: {e}")
         return False
@@ -419,7 +621,7 @@ def validate_cloudwatch_permissions(cluster_id: str, region: str) -> bool:
         print(f"❌ CloudWatch权限验证出错: {e}")
         return False
 
-def check_data_availability(metrics: Dict[str, List[Dict]]) -> Dict[str, Any]:
+def check_data_availability(metrics: Dict[str, MetricSeries]) -> Dict[str, Any]:
     """
     检查数据质量和可用性
     
@@ -435,25 +637,26 @@ def check_data_availability(metrics: Dict[str, List[Dict]]) -> Dict[str, Any]:
     total_actual_points = 0
     missing_metrics = []
     sparse_metrics = []
+    first_time_span = None  # 第一个有数据的指标的时间跨度（秒），用于估算期望数据点数
     
-    for metric_name, datapoints in metrics.items():
-        actual_count = len(datapoints)
+    for metric_name, series in metrics.items():
+        actual_count = len(series.values)
         total_actual_points += actual_count
         
         if actual_count == 0:
             missing_metrics.append(metric_name)
-        elif actual_count < 10:  # 少于10个数据点认为是稀疏的
+            continue
+        
+        if actual_count < 10:  # 少于10个数据点认为是稀疏的
             sparse_metrics.append(f"{metric_name}({actual_count}个点)")
+        
+        if first_time_span is None:
+            first_time_span = int((series.timestamps[-1] - series.timestamps[0]).astype('timedelta64[s]').astype(np.int64))
     
     # 计算数据完整性
-    if total_actual_points > 0:
-        # 估算期望的数据点数（基于第一个有数据的指标）
-        for datapoints in metrics.values():
-            if datapoints:
-                time_span = (datapoints[-1]['Timestamp'] - datapoints[0]['Timestamp']).total_seconds()
-                expected_points_per_metric = int(time_span / 60) + 1  # 60秒间隔
-                total_expected_points = expected_points_per_metric * len(metrics)
-                break
+    if first_time_span is not None:
+        expected_points_per_metric = first_time_span // 60 + 1  # 60秒间隔
+        total_expected_points = expected_points_per_metric * len(metrics)
     
     completeness = (total_actual_points / total_expected_points * 100) if total_expected_points > 0 else 0
     
@@ -510,7 +713,7 @@ def print_results(cluster_id: str, region: str, days: int, analysis_result: Dict
     # 分析周期
     if analysis_result['analysis_period']:
         start_time, end_time = analysis_result['analysis_period']
-        print(f"   分析周期: {start_time.strftime('%Y-%m-%d %H:%M')} ~ {end_time.strftime('%Y-%m-%d %H:%M')} ({days}天)")
+        print(f"   分析周期: {start_time:%Y-%m-%d %H:%M} ~ {end_time:%Y-%m-%d %H:%M} ({days}天)")
     
     # 数据质量
     print(f"\n📊 数据质量:")
@@ -528,12 +731,16 @@ def print_results(cluster_id: str, region: str, days: int, analysis_result: Dict
     print(f"   总时间点: {analysis_result['total_points']}")
     print(f"   活跃时间点: {analysis_result['active_points']}")
     print(f"   空闲时间点: {analysis_result['idle_points']}")
+    if analysis_result.get('rolling_idle_range'):
+        lowest_idle, highest_idle = analysis_result['rolling_idle_range']
+        print(f"   滚动1小时空闲率: 最低 {lowest_idle:.1f}%, 最高 {highest_idle:.1f}%")
     
-    # 各指标活跃统计
-    print(f"\n📈 各指标活跃统计:")
-    for metric, count in analysis_result['activity_breakdown'].items():
-        percentage = (count / analysis_result['total_points'] * 100) if analysis_result['total_points'] > 0 else 0
-        print(f"   {metric}: {count} 次 ({percentage:.1f}%)")
+    # 各指标活跃统计（使用Metric Math时没有单个指标的数据，不输出）
+    if analysis_result['activity_breakdown']:
+        print(f"\n📈 各指标活跃统计:")
+        for metric, count in analysis_result['activity_breakdown'].items():
+            percentage = (count / analysis_result['total_points'] * 100) if analysis_result['total_points'] > 0 else 0
+            print(f"   {metric}: {count} 次 ({percentage:.1f}%)")
     
     # 成本分析
     currency = cost_analysis.get('currency_symbol', '¥')
@@ -588,10 +795,9 @@ def print_progress_bar(current: int, total: int, prefix: str = "", length: int =
     percent = current / total
     filled_length = int(length * percent)
     bar = '█' * filled_length + '-' * (length - filled_length)
-    print(f'\r{prefix} |{bar}| {percent:.1%} ({current}/{total})', end='', flush=True)
-    
-    if current == total:
-        print()  # 换行
+    # 中间状态需要立即刷新；最终结果换行后交给标准输出自身的缓冲
+    done = current == total
+    print(f'\r{prefix} |{bar}| {percent:.1%} ({current}/{total})', end='\n' if done else '', flush=not done)
 
 def format_duration(seconds: float) -> str:
     """
@@ -613,7 +819,7 @@ def format_duration(seconds: float) -> str:
         return f"{hours:.1f}小时"
 
 def generate_mock_metrics(duration_hours: int = 24, active_percentage: float = 30.0, 
-                         pattern: str = 'business_hours') -> Dict[str, List[Dict]]:
+                         pattern: str = 'business_hours') -> Dict[str, MetricSeries]:
     """
     生成模拟的CloudWatch指标数据用于测试
     
@@ -625,82 +831,61 @@ def generate_mock_metrics(duration_hours: int = 24, active_percentage: float = 3
     Returns:
         模拟的指标数据字典
     """
-    import random  # 在函数内部导入
-    
     print(f"🧪 生成模拟数据: {duration_hours}小时, {active_percentage}%活跃, 模式={pattern}")
     
-    end_time = datetime.now(timezone.utc)
-    start_time = end_time - timedelta(hours=duration_hours)
-    
-    # 生成时间序列（5分钟间隔）
-    timestamps = []
-    current_time = start_time
-    while current_time <= end_time:
-        timestamps.append(current_time)
-        current_time += timedelta(minutes=5)
+    end_time = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 's')
+    start_time = end_time - np.timedelta64(duration_hours, 'h')
     
-    total_points = len(timestamps)
+    # 生成时间序列（5分钟间隔，包含结束时间）
+    ts_array = np.arange(start_time, end_time + np.timedelta64(1, 's'), np.timedelta64(5, 'm'))
+    total_points = len(ts_array)
     target_active_points = int(total_points * active_percentage / 100)
+    rng = np.random.default_rng()
     
     # 根据模式生成活跃时间点
-    active_indices = set()
+    active_indices = np.empty(0, dtype=np.int64)
     
     if pattern == 'business_hours':
         # 工作时间模式：周一到周五的9-18点更活跃
-        for i, ts in enumerate(timestamps):
-            if ts.weekday() < 5:  # 周一到周五
-                if 9 <= ts.hour < 18:  # 工作时间
-                    if len(active_indices) < target_active_points:
-                        active_indices.add(i)
+        minutes = ts_array.astype('datetime64[m]').astype(np.int64)
+        weekday = (minutes // 1440 + 3) % 7  # 1970-01-01是周四
+        hour = (minutes // 60) % 24
+        is_business_hour = (weekday < 5) & (hour >= 9) & (hour < 18)
+        active_indices = np.flatnonzero(is_business_hour)[:target_active_points]
         
         # 如果工作时间不够，随机添加一些
-        while len(active_indices) < target_active_points:
-            active_indices.add(random.randint(0, total_points - 1))
+        shortfall = target_active_points - active_indices.size
+        if shortfall > 0:
+            candidates = np.setdiff1d(np.arange(total_points), active_indices, assume_unique=True)
+            active_indices = np.concatenate(
+                [active_indices, rng.choice(candidates, size=shortfall, replace=False)]
+            )
             
     elif pattern == 'random':
         # 随机模式
-        active_indices = set(random.sample(range(total_points), target_active_points))
+        active_indices = rng.choice(total_points, size=target_active_points, replace=False)
         
     elif pattern == 'constant':
         # 持续模式：前面一段时间活跃
-        for i in range(min(target_active_points, total_points)):
-            active_indices.add(i)
+        active_indices = np.arange(min(target_active_points, total_points))
+    
+    # 生成指标值 - 只生成用于判断活跃状态的指标，空闲时间点为0
+    active_count = active_indices.size
+    # 活跃判断只需比较是否大于0，使用较小的数据类型节省内存
+    read_iops = np.zeros(total_points, dtype=np.float32)
+    write_iops = np.zeros(total_points, dtype=np.float32)
+    connections = np.zeros(total_points, dtype=np.int16)
+    read_iops[active_indices] = rng.uniform(10, 100, size=active_count)
+    write_iops[active_indices] = rng.uniform(5, 50, size=active_count)
+    connections[active_indices] = rng.integers(1, 20, size=active_count, endpoint=True, dtype=np.int16)
     
-    # 生成指标数据 - 只生成用于判断活跃状态的指标
     metrics = {
-        'ReadIOPS': [],
-        'WriteIOPS': [],
-        'DatabaseConnections': []
+        'ReadIOPS': MetricSeries(ts_array, read_iops),
+        'WriteIOPS': MetricSeries(ts_array, write_iops),
+        'DatabaseConnections': MetricSeries(ts_array, connections)
     }
     
-    for i, timestamp in enumerate(timestamps):
-        is_active = i in active_indices
-        
-        # 生成指标值
-        if is_active:
-            read_iops = random.uniform(10, 100)
-            write_iops = random.uniform(5, 50)
-            connections = random.randint(1, 20)
-        else:
-            read_iops = 0
-            write_iops = 0
-            connections = 0
-        
-        # 添加数据点
-        metrics['ReadIOPS'].append({
-            'Timestamp': timestamp,
-            'Average': read_iops
-        })
-        metrics['WriteIOPS'].append({
-            'Timestamp': timestamp,
-            'Average': write_iops
-        })
-        metrics['DatabaseConnections'].append({
-            'Timestamp': timestamp,
-            'Average': connections
-        })
-    
-    print(f"✓ 生成了 {total_points} 个时间点的模拟数据，其中 {len(active_indices)} 个活跃点")
+    print(f"✓ 生成了 {total_points} 个时间点的模拟数据，其中 {active_count} 个活跃点")
     return metrics
 
 def test_with_mock_data() -> bool:
@@ -747,7 +932,7 @@ def test_with_mock_data() -> bool:
                 all_passed = False
             
             # 验证数据完整性（修正计算）
-            total_points = sum(len(points) for points in mock_metrics.values())
+            total_points = sum(len(series.values) for series in mock_metrics.values())
             # 每5分钟一个点，每小时12个点，3个指标（ReadIOPS, WriteIOPS, DatabaseConnections）
             expected_points_per_metric = test_case['duration'] * 12 + 1  # +1因为包含结束时间点
             expected_total_points = expected_points_per_metric * 3
@@ -785,11 +970,11 @@ def test_edge_cases() -> bool:
     print("\n--- 测试: 空数据处理 ---")
     try:
         empty_metrics = {
-            'ReadIOPS': [],
-            'WriteIOPS': [],
-            'DatabaseConnections': [],
-            'NetworkReceiveThroughput': [],
-            'NetworkTransmitThroughput': []
+            'ReadIOPS': to_metric_series([], []),
+            'WriteIOPS': to_metric_series([], []),
+            'DatabaseConnections': to_metric_series([], []),
+            'NetworkReceiveThroughput': to_metric_series([], []),
+            'NetworkTransmitThroughput': to_metric_series([], [])
         }
         
         result = calculate_idle_percentage(empty_metrics)
@@ -808,11 +993,11 @@ def test_edge_cases() -> bool:
     try:
         test_timestamp = datetime.now(timezone.utc)
         single_point_metrics = {
-            'ReadIOPS': [{'Timestamp': test_timestamp, 'Average': 10.0}],
-            'WriteIOPS': [{'Timestamp': test_timestamp, 'Average': 0.0}],
-            'DatabaseConnections': [{'Timestamp': test_timestamp, 'Average': 0.0}],
-            'NetworkReceiveThroughput': [{'Timestamp': test_timestamp, 'Average': 0.0}],
-            'NetworkTransmitThroughput': [{'Timestamp': test_timestamp, 'Average': 0.0}]
+            'ReadIOPS': to_metric_series([test_timestamp], [10.0]),
+            'WriteIOPS': to_metric_series([test_timestamp], [0.0]),
+            'DatabaseConnections': to_metric_series([test_timestamp], [0.0]),
+            'NetworkReceiveThroughput': to_metric_series([test_timestamp], [0.0]),
+            'NetworkTransmitThroughput': to_metric_series([test_timestamp], [0.0])
         }
         
         result = calculate_idle_percentage(single_point_metrics)
@@ -826,7 +1011,64 @@ def test_edge_cases() -> bool:
         print(f"❌ 单个数据点测试异常: {e}")
         all_passed = False
     
-    # 测试3: 输入验证
+    # 测试3: 滚动空闲率
+    print("\n--- 测试: 滚动空闲率 ---")
+    try:
+        minute = np.timedelta64(60, 's')
+        start = np.datetime64('2024-01-01T00:00:00', 's')
+        active_mask = np.array([True, False, False, True, False, False, False, True])
+        timestamps = start + np.arange(active_mask.size) * minute
+        rolling = rolling_idle_fraction(timestamps, active_mask, 4 * minute, minute)
+        expected = np.array([0.5, 0.75, 0.75, 0.75, 0.75])
+        contiguous_ok = (np.allclose(rolling, expected) 
+                         and rolling_idle_fraction(timestamps, active_mask, 9 * minute, minute).size == 0)
+        
+        # 30分钟活跃、2天数据缺口、30分钟空闲：1小时窗口不应跨越缺口混合两段数据
+        gap_timestamps = np.concatenate([
+            start + np.arange(30) * minute,
+            start + np.timedelta64(2, 'D') + np.arange(30) * minute
+        ])
+        gap_metrics = {
+            'ReadIOPS': MetricSeries(gap_timestamps, np.repeat([1.0, 0.0], 30))
+        }
+        gap_range = calculate_idle_percentage(gap_metrics)['rolling_idle_range']
+        
+        if contiguous_ok and gap_range == (0.0, 100.0):
+            print("✅ 滚动空闲率计算正确")
+        else:
+            print(f"❌ 滚动空闲率计算失败: {rolling}, 数据缺口: {gap_range}")
+            all_passed = False
+            
+    except Exception as e:
+        print(f"❌ 滚动空闲率测试异常: {e}")
+        all_passed = False
+    
+    # 测试4: RPU计算
+    print("\n--- 测试: RPU计算 ---")
+    try:
+        rpu_cases = [
+            ('dc2.large', 1, 8),
+            ('dc2.large', 16, 8),
+            ('dc2.large', 17, 8),
+            ('ra3.xlplus', 5, 16),
+            ('ra3.16xlarge', 3, 96),
+        ]
+        rpu_failures = [
+            (node_type, number_of_nodes, calculate_rpu_requirement(node_type, number_of_nodes), expected)
+            for node_type, number_of_nodes, expected in rpu_cases
+            if calculate_rpu_requirement(node_type, number_of_nodes) != expected
+        ]
+        if not rpu_failures:
+            print("✅ RPU计算正确")
+        else:
+            print(f"❌ RPU计算失败: {rpu_failures}")
+            all_passed = False
+            
+    except Exception as e:
+        print(f"❌ RPU计算测试异常: {e}")
+        all_passed = False
+    
+    # 测试5: 输入验证
     print("\n--- 测试: 输入验证 ---")
     test_inputs = [
         ('', 'us-east-1', 7, "空集群ID"),
@@ -846,6 +1088,118 @@ def test_edge_cases() -> bool:
             print(f"❌ {description}: 意外异常 {e}")
             all_passed = False
     
+    # 测试6: 分批获取数据合并（模拟GetMetricData分页，无需AWS访问）
+    print("\n--- 测试: 分批获取数据合并 ---")
+    try:
+        base_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # 模拟数据：第0~9分钟，第6分钟缺失，取值为分钟数
+        reported_minutes = [minute for minute in range(-1, 11) if minute != 6]
+        
+        class FakePaginator:
+            def paginate(self, MetricDataQueries, StartTime, EndTime, **kwargs):
+                # 多返回窗口前一个点和终点上的点，奇数分钟带30秒偏移，并将分页倒序返回、重复一个点
+                first = int((StartTime - base_time).total_seconds() // 60) - 1
+                last = int((EndTime - base_time).total_seconds() // 60)
+                minutes = [minute for minute in reported_minutes if first <= minute <= last]
+                timestamps = [base_time + timedelta(minutes=minute, seconds=30 * (minute % 2)) 
+                              for minute in minutes]
+                values = [float(minute) for minute in minutes]
+                middle = len(minutes) // 2
+                yield {'MetricDataResults': [{'Id': 'm0', 'Timestamps': timestamps[middle:] + timestamps[:1], 
+                                              'Values': values[middle:] + values[:1]}]}
+                yield {'MetricDataResults': [{'Id': 'm0', 'Timestamps': timestamps[:middle], 
+                                              'Values': values[:middle]}]}
+        
+        class FakeCloudWatch:
+            def get_paginator(self, operation_name):
+                return FakePaginator()
+        
+        # 每个序列4个点即达到单次请求上限，起点未对齐时第一个窗口截短到对齐的分界点
+        windows = split_metric_data_windows(base_time + timedelta(seconds=30), base_time + timedelta(minutes=10),
+                                            60, GET_METRIC_DATA_MAX_DATAPOINTS // 4)
+        expected_windows = [
+            (base_time + timedelta(seconds=30), base_time + timedelta(minutes=4)),
+            (base_time + timedelta(minutes=4), base_time + timedelta(minutes=8)),
+            (base_time + timedelta(minutes=8), base_time + timedelta(minutes=10)),
+        ]
+        
+        queries = build_metric_data_queries('test-cluster', ['ReadIOPS'])
+        merged = concat_metric_series([
+            get_metric_data_window(FakeCloudWatch(), queries, window_start, window_end)['ReadIOPS']
+            for window_start, window_end in windows
+        ])
+        expected_minutes = [minute for minute in range(10) if minute != 6]
+        expected_timestamps = (np.datetime64(base_time.replace(tzinfo=None), 's') 
+                               + np.array(expected_minutes) * np.timedelta64(60, 's'))
+        
+        if (windows == expected_windows 
+                and np.array_equal(merged.timestamps, expected_timestamps)
+                and np.array_equal(merged.values, np.array(expected_minutes, dtype=np.float64))):
+            print("✅ 分批获取数据合并正确")
+        else:
+            print(f"❌ 分批获取数据合并失败: {windows}, {merged}")
+            all_passed = False
+            
+    except Exception as e:
+        print(f"❌ 分批获取数据合并测试异常: {e}")
+        all_passed = False
+    
+    # 测试7: 价格缓存（使用临时目录，不读写用户的缓存文件）
+    print("\n--- 测试: 价格缓存 ---")
+    global _CACHE_DIR, _PRICE_CACHE_FILE
+    original_cache_dir, original_cache_file = _CACHE_DIR, _PRICE_CACHE_FILE
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _CACHE_DIR = os.path.join(temp_dir, 'cache')
+            _PRICE_CACHE_FILE = os.path.join(_CACHE_DIR, 'prices.json')
+            cache_key = 'us-east-1|rpu||on_demand'
+            cache_checks = {}
+            
+            # 写入后命中，来源标记为cache
+            _write_price_cache(cache_key, PriceInfo(0.5, 'USD', 'api'))
+            cache_checks['命中'] = _read_price_cache(cache_key) == PriceInfo(0.5, 'USD', 'cache')
+            
+            # 离线模式忽略缓存，备用价格不写入缓存
+            with open(_PRICE_CACHE_FILE, 'rb') as f:
+                cache_before = f.read()
+            set_pricing_offline(True)
+            try:
+                offline_price = get_rpu_price_dynamic('us-east-1')
+            finally:
+                set_pricing_offline(False)
+            with open(_PRICE_CACHE_FILE, 'rb') as f:
+                cache_after = f.read()
+            cache_checks['离线'] = offline_price['source'] == 'hardcoded' and cache_before == cache_after
+            
+            # 过期条目不再使用
+            with open(_PRICE_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({cache_key: {'price': 0.5, 'currency': 'USD', 'expires': time.time() - 1}}, f)
+            cache_checks['过期'] = _read_price_cache(cache_key) is None
+            
+            # 损坏的缓存文件被忽略，写入时整体覆盖
+            with open(_PRICE_CACHE_FILE, 'w', encoding='utf-8') as f:
+                f.write('{not json')
+            cache_checks['损坏'] = _load_price_cache() == {} and _read_price_cache(cache_key) is None
+            _write_price_cache(cache_key, PriceInfo(0.6, 'USD', 'api'))
+            cache_checks['覆盖'] = _read_price_cache(cache_key) == PriceInfo(0.6, 'USD', 'cache')
+            
+            clear_price_cache()
+            cache_checks['清除'] = not os.path.exists(_PRICE_CACHE_FILE)
+        
+        failed_checks = [name for name, passed in cache_checks.items() if not passed]
+        if not failed_checks:
+            print("✅ 价格缓存处理正确")
+        else:
+            print(f"❌ 价格缓存处理失败: {', '.join(failed_checks)}")
+            all_passed = False
+            
+    except Exception as e:
+        print(f"❌ 价格缓存测试异常: {e}")
+        all_passed = False
+    finally:
+        _CACHE_DIR, _PRICE_CACHE_FILE = original_cache_dir, original_cache_file
+        _lookup_redshift_price.cache_clear()
+    
     if all_passed:
         print(f"\n✅ 所有边界情况测试通过!")
     else:
@@ -876,62 +1230,196 @@ def run_all_tests() -> bool:
     
     return all_passed
 
-def get_cloudwatch_metrics_batch(cloudwatch, cluster_id: str, metric_name: str, 
-                                start_time: datetime, end_time: datetime, period: int = 60) -> List[Dict]:
+def build_metric_data_queries(cluster_id: str, metric_names: List[str], period: int = 60,
+                              server_side_activity: bool = False) -> List[Dict]:
     """
-    分批获取单个指标的CloudWatch数据
+    构建GetMetricData的查询列表，一次请求获取所有指标
     
     Args:
-        cloudwatch: CloudWatch客户端
         cluster_id: 集群标识符
-        metric_name: 指标名称
+        metric_names: 指标名称列表
+        period: 采样间隔（秒）
+        server_side_activity: 为True时不返回原始指标，改为通过Metric Math在服务端
+            合并为单个活跃标记序列（任一指标大于0为1，否则为0）
+        
+    Returns:
+        MetricDataQueries列表，查询ID为m0, m1, ...，与metric_names顺序一致，
+        Label为返回结果中使用的序列名称
+    """
+    queries = [
+        {
+            'Id': f'm{i}',
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': 'AWS/Redshift',
+                    'MetricName': metric_name,
+                    'Dimensions': [{'Name': 'ClusterIdentifier', 'Value': cluster_id}]
+                },
+                'Period': period,
+                'Stat': 'Average'
+            },
+            'Label': metric_name,
+            'ReturnData': not server_side_activity
+        }
+        for i, metric_name in enumerate(metric_names)
+    ]
+    
+    if server_side_activity:
+        # SUM按时间点合并已上报的指标：部分指标缺点时仍能判断，全部缺失的时间点不返回，
+        # 与原始指标路径一致，数据缺口仍会体现在数据质量检查中
+        metric_ids = ', '.join(query['Id'] for query in queries)
+        queries.append({
+            'Id': 'active',
+            'Expression': f'IF(SUM([{metric_ids}]) > 0, 1, 0)',
+            'Label': ACTIVITY_SERIES_NAME,
+            'ReturnData': True
+        })
+    
+    return queries
+
+def get_metric_data_window(cloudwatch, queries: List[Dict], start_time: datetime, 
+                           end_time: datetime, period: int = 60) -> Dict[str, MetricSeries]:
+    """
+    获取单个时间窗口内所有返回序列的数据（限流重试由客户端配置处理）
+    
+    各序列按采样间隔预分配时间槽，分页结果直接写入对应槽位，无需逐页合并和重新排序。
+    
+    Args:
+        cloudwatch: CloudWatch客户端
+        queries: build_metric_data_queries构建的查询列表
+        start_time: 窗口开始时间
+        end_time: 窗口结束时间
+        period: 采样间隔（秒），时间戳按此间隔对齐
+        
+    Returns:
+        以查询Label为键的时间序列
+    """
+    id_to_metric = {query['Id']: query['Label'] for query in queries if query.get('ReturnData', True)}
+    
+    # 窗口内的时间槽[起点向下取整, 终点向上取整)，与相邻窗口的时间槽不重叠
+    first_epoch = int(start_time.timestamp()) // period * period
+    first_slot = np.datetime64(first_epoch, 's')
+    slot_count = int(-(-(end_time.timestamp() - first_epoch) // period))
+    slot_values = {metric_name: np.zeros(slot_count) for metric_name in id_to_metric.values()}
+    slot_filled = {metric_name: np.zeros(slot_count, dtype=bool) for metric_name in id_to_metric.values()}
+    paginator = cloudwatch.get_paginator('get_metric_data')
+    
+    for response in paginator.paginate(
+        MetricDataQueries=queries,
+        StartTime=start_time,
+        EndTime=end_time,
+        ScanBy='TimestampAscending'
+    ):
+        for result in response.get('MetricDataResults', []):
+            metric_name = id_to_metric.get(result['Id'])
+            if metric_name is None:
+                continue
+            page = to_metric_series(result.get('Timestamps', []), result.get('Values', []), period)
+            offsets = (page.timestamps - first_slot) // np.timedelta64(period, 's')
+            in_window = (offsets >= 0) & (offsets < slot_count)
+            slot_values[metric_name][offsets[in_window]] = page.values[in_window]
+            slot_filled[metric_name][offsets[in_window]] = True
+    
+    slot_timestamps = first_slot + np.arange(slot_count) * np.timedelta64(period, 's')
+    return {
+        metric_name: MetricSeries(slot_timestamps[filled], slot_values[metric_name][filled])
+        for metric_name, filled in slot_filled.items()
+    }
+
+def split_metric_data_windows(start_time: datetime, end_time: datetime, period: int, 
+                              series_count: int) -> List[Tuple[datetime, datetime]]:
+    """
+    按GetMetricData单次请求的数据点上限切分时间范围
+    
+    窗口之间的分界点按采样间隔对齐，每个时间槽只落在一个窗口内。
+    
+    Args:
         start_time: 开始时间
         end_time: 结束时间
         period: 采样间隔（秒）
+        series_count: 每个请求返回的序列数
         
     Returns:
-        数据点列表
+        (窗口开始时间, 窗口结束时间)列表
     """
-    all_datapoints = []
-    current_start = start_time
+    points_per_series = GET_METRIC_DATA_MAX_DATAPOINTS // max(series_count, 1)
+    window_seconds = period * points_per_series
     
+    windows = []
+    current_start = start_time
     while current_start < end_time:
-        # 每批最多查询1天的数据（60秒采样 = 1440个点）
-        batch_end = min(current_start + timedelta(days=1), end_time)
+        # 第一个窗口的起点可能未对齐，截短到下一个对齐的分界点
+        misalignment = current_start.timestamp() % period
+        window_end = min(current_start + timedelta(seconds=window_seconds - misalignment), end_time)
+        windows.append((current_start, window_end))
+        current_start = window_end
+    return windows
+
+def get_cloudwatch_metrics_batch(cloudwatch, cluster_id: str, metric_names: List[str], 
+                                start_time: datetime, end_time: datetime, period: int = 60,
+                                max_workers: int = 8, 
+                                server_side_activity: bool = False) -> Dict[str, MetricSeries]:
+    """
+    分批并发获取多个指标的CloudWatch数据
+    
+    时间范围按单次GetMetricData请求的数据点上限切分为尽量少的窗口，
+    每个窗口通过一次请求获取所有指标，各窗口的请求并发执行。
+    
+    Args:
+        cloudwatch: CloudWatch客户端
+        cluster_id: 集群标识符
+        metric_names: 指标名称列表
+        start_time: 开始时间
+        end_time: 结束时间
+        period: 采样间隔（秒）
+        max_workers: 最大并发请求数
+        server_side_activity: 是否只获取服务端合并的活跃标记序列
         
-        try:
-            response = cloudwatch.get_metric_statistics(
-                Namespace='AWS/Redshift',
-                MetricName=metric_name,
-                Dimensions=[{'Name': 'ClusterIdentifier', 'Value': cluster_id}],
-                StartTime=current_start,
-                EndTime=batch_end,
-                Period=period,
-                Statistics=['Average']
-            )
-            
-            batch_datapoints = response.get('Datapoints', [])
-            all_datapoints.extend(batch_datapoints)
-            
-            print(f"       批次 {current_start.strftime('%m-%d')} ~ {batch_end.strftime('%m-%d')}: {len(batch_datapoints)} 个数据点")
+    Returns:
+        各指标按时间排序的时间序列
+        
+    Raises:
+        ClientError: 任一窗口获取失败（限流已由客户端自适应重试处理）
+    """
+    queries = build_metric_data_queries(cluster_id, metric_names, period, server_side_activity)
+    windows = split_metric_data_windows(start_time, end_time, period, 
+                                        sum(1 for query in queries if query['ReturnData']))
+    
+    all_datapoints = {query['Label']: [] for query in queries if query['ReturnData']}
+    
+    # 线程数不超过窗口数，避免为少量窗口创建空闲线程
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(windows)))) as executor:
+        futures = {
+            executor.submit(get_metric_data_window, cloudwatch, queries, 
+                            window_start, window_end, period): f"{window_start:%m-%d} ~ {window_end:%m-%d}"
+            for window_start, window_end in windows
+        }
+        
+        for future in as_completed(futures):
+            window_label = futures[future]
+            try:
+                window_metrics = future.result()
+            except ClientError as e:
+                # 单个窗口可能覆盖二十多天的数据，失败时整体报错，避免在数据缺失的情况下继续分析
+                print(f"       ❌ 批次 {window_label} 失败: {e}")
+                for pending in futures:
+                    pending.cancel()
+                raise
             
-            # 避免API限流
-            time.sleep(0.1)
+            batch_count = 0
+            for metric_name, series in window_metrics.items():
+                all_datapoints[metric_name].append(series)
+                batch_count += len(series.values)
             
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'Throttling':
-                print(f"       ⚠️  API限流，等待重试...")
-                time.sleep(2)
-                # 重试当前批次
-                continue
-            else:
-                print(f"       ❌ 批次失败: {e}")
-        
-        current_start = batch_end
+            print(f"       批次 {window_label}: {batch_count} 个数据点")
     
-    return sorted(all_datapoints, key=lambda x: x['Timestamp'])
+    return {
+        metric_name: concat_metric_series(series_list)
+        for metric_name, series_list in all_datapoints.items()
+    }
 
-def get_cloudwatch_metrics(cluster_id: str, region: str, days: int) -> Dict[str, List[Dict]]:
+def get_cloudwatch_metrics(cluster_id: str, region: str, days: int, 
+                           server_side_activity: bool = False) -> Dict[str, MetricSeries]:
     """
     获取CloudWatch指标数据
     
@@ -939,9 +1427,10 @@ def get_cloudwatch_metrics(cluster_id: str, region: str, days: int) -> Dict[str,
         cluster_id: Redshift集群标识符
         region: AWS区域
         days: 分析天数
+        server_side_activity: 是否使用Metric Math在服务端合并指标，只获取活跃标记序列
         
     Returns:
-        包含各指标数据点的字典
+        包含各指标时间序列的字典
         
     Raises:
         ClientError: AWS API调用失败
@@ -950,43 +1439,40 @@ def get_cloudwatch_metrics(cluster_id: str, region: str, days: int) -> Dict[str,
     print("📊 开始获取CloudWatch指标数据...")
     
     try:
-        cloudwatch = boto3.client('cloudwatch', region_name=region)
+        cloudwatch = _client('cloudwatch', region, _CLOUDWATCH_CONFIG)
         end_time = datetime.now(timezone.utc)
         start_time = end_time - timedelta(days=days)
         
-        print(f"   时间范围: {start_time.strftime('%Y-%m-%d %H:%M')} 到 {end_time.strftime('%Y-%m-%d %H:%M')}")
+        print(f"   时间范围: {start_time:%Y-%m-%d %H:%M} 到 {end_time:%Y-%m-%d %H:%M}")
         
-        # 定义要收集的指标 - 只收集用于判断活跃状态的指标
-        metric_names = [
-            'ReadIOPS',
-            'WriteIOPS', 
-            'DatabaseConnections'
-        ]
+        # 只收集用于判断活跃状态的指标
+        metric_names = list(ACTIVITY_METRICS)
         
         # 固定使用60秒采样，与Serverless计费周期一致
         period = 60
         print(f"   采样间隔: {period}秒 (与Serverless计费周期一致)")
         
         # 计算是否需要分批查询
-        time_span_hours = (end_time - start_time).total_seconds() / 3600
-        if time_span_hours > 24:
-            print(f"   数据跨度 {time_span_hours:.1f} 小时，将分批查询以保持60秒采样精度")
-        
-        metrics = {}
-        total_metrics = len(metric_names)
+        series_count = 1 if server_side_activity else len(metric_names)
+        window_count = len(split_metric_data_windows(start_time, end_time, period, series_count))
+        if window_count > 1:
+            time_span_hours = (end_time - start_time).total_seconds() / 3600
+            print(f"   数据跨度 {time_span_hours:.1f} 小时，将分 {window_count} 批并发查询以保持60秒采样精度")
+        
+        print(f"   获取指标: {', '.join(metric_names)}")
+        if server_side_activity:
+            print(f"   使用Metric Math在服务端合并为活跃标记序列 ({ACTIVITY_SERIES_NAME})")
+        
+        # 使用分批并发查询获取所有指标数据
+        metrics = get_cloudwatch_metrics_batch(
+            cloudwatch, cluster_id, metric_names, start_time, end_time, period,
+            server_side_activity=server_side_activity
+        )
         
-        for i, metric_name in enumerate(metric_names, 1):
-            print(f"   获取指标 {i}/{total_metrics}: {metric_name}")
-            
-            # 使用分批查询获取数据
-            datapoints = get_cloudwatch_metrics_batch(
-                cloudwatch, cluster_id, metric_name, start_time, end_time, period
-            )
-            
-            metrics[metric_name] = datapoints
-            print(f"     ✓ 总计获取到 {len(datapoints)} 个数据点")
+        for metric_name, series in metrics.items():
+            print(f"     ✓ {metric_name}: 总计获取到 {len(series.values)} 个数据点")
         
-        total_points = sum(len(points) for points in metrics.values())
+        total_points = sum(len(series.values) for series in metrics.values())
         print(f"✓ CloudWatch数据获取完成，总计 {total_points} 个数据点")
         
         return metrics
@@ -997,97 +1483,118 @@ def get_cloudwatch_metrics(cluster_id: str, region: str, days: int) -> Dict[str,
         error_code = e.response['Error']['Code']
         if error_code == 'AccessDenied':
             raise ClientError(
-                {'Error': {'Code': 'AccessDenied', 'Message': '权限不足。请确保具有cloudwatch:GetMetricStatistics权限。'}},
-                'GetMetricStatistics'
+                {'Error': {'Code': 'AccessDenied', 'Message': '权限不足。请确保具有cloudwatch:GetMetricData权限。'}},
+                'GetMetricData'
             )
         else:
             raise
 
-def safe_get_metrics(cluster_id: str, region: str, days: int, max_retries: int = 3) -> Dict[str, List[Dict]]:
+def safe_get_metrics(cluster_id: str, region: str, days: int, 
+                     server_side_activity: bool = False) -> Dict[str, MetricSeries]:
     """
-    安全获取指标数据，包含重试逻辑
+    安全获取指标数据，出错时打印错误并退出
+    
+    限流和瞬时错误已由CloudWatch客户端的自适应重试处理，这里只处理不可重试的错误。
     
     Args:
         cluster_id: Redshift集群标识符
         region: AWS区域
         days: 分析天数
-        max_retries: 最大重试次数
+        server_side_activity: 是否使用Metric Math在服务端合并指标
         
     Returns:
         指标数据字典
     """
-    for attempt in range(max_retries):
-        try:
-            return get_cloudwatch_metrics(cluster_id, region, days)
-        except ClientError as e:
-            error_code = e.response['Error']['Code']
-            if error_code == 'Throttling' and attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"⚠️  API限流，等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"❌ CloudWatch API错误: {e}")
-                sys.exit(1)
-        except Exception as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"⚠️  获取数据失败，等待 {wait_time} 秒后重试: {e}")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"❌ 达到最大重试次数，退出: {e}")
-                sys.exit(1)
+    try:
+        return get_cloudwatch_metrics(cluster_id, region, days, server_side_activity)
+    except ClientError as e:
+        print(f"❌ CloudWatch API错误: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ 获取数据失败，退出: {e}")
+        sys.exit(1)
+
+def _values_at_timestamps(timestamps: np.ndarray, values: np.ndarray, 
+                          targets: np.ndarray, tolerance_seconds: int = 60) -> np.ndarray:
+    """
+    批量获取目标时间点的指标值
     
-    return {}
+    对每个目标时间点取容差范围内最早的数据点，没有则为0.0。
+    
+    Args:
+        timestamps: 已排序的数据点时间戳
+        values: 对应的指标值
+        targets: 目标时间戳
+        tolerance_seconds: 允许的时间误差（秒）
+        
+    Returns:
+        与targets等长的指标值数组
+    """
+    tolerance = np.timedelta64(tolerance_seconds, 's')
+    result = np.zeros(targets.shape, dtype=np.float64)
+    if timestamps.size == 0:
+        return result
+    
+    idx = np.searchsorted(timestamps, targets - tolerance, side='left')
+    in_range = idx < timestamps.size
+    idx_clipped = np.minimum(idx, timestamps.size - 1)
+    matched = in_range & (timestamps[idx_clipped] <= targets + tolerance)
+    result[matched] = values[idx_clipped[matched]]
+    return result
 
-def get_value_at_timestamp(metric_data: List[Dict], target_timestamp: datetime) -> float:
+def rolling_idle_fraction(timestamps: np.ndarray, active_mask: np.ndarray, 
+                          window: np.timedelta64, period: np.timedelta64) -> np.ndarray:
     """
-    获取指定时间戳的指标值
+    计算按时间划分的滑动窗口内的空闲比例
+    
+    时间点按采样间隔映射到连续的时间槽上，窗口按时间长度滑动，跨越数据缺口时
+    只统计窗口内实际上报的时间点，完全没有数据的窗口被跳过。基于累计和实现，
+    整体为O(时间槽数)，与窗口大小无关。
     
     Args:
-        metric_data: 指标数据点列表
-        target_timestamp: 目标时间戳
+        timestamps: 已排序的时间戳
+        active_mask: 与时间戳对应的活跃标记数组
+        window: 窗口时间长度
+        period: 采样间隔
         
     Returns:
-        指标值，如果没有找到则返回0.0
+        各窗口的空闲比例数组（0~1），时间跨度不足一个窗口时为空数组
     """
-    for point in metric_data:
-        # 允许60秒的时间误差（与采样间隔一致）
-        if abs((point['Timestamp'] - target_timestamp).total_seconds()) <= 60:
-            return point.get('Average', 0.0)
-    return 0.0
+    window_slots = int(window // period) if period > np.timedelta64(0, 's') else 0
+    if window_slots <= 0 or timestamps.size == 0:
+        return np.empty(0, dtype=np.float64)
+    
+    slots = ((timestamps - timestamps[0]) // period).astype(np.int64)
+    slot_count = int(slots[-1]) + 1
+    if slot_count < window_slots:
+        return np.empty(0, dtype=np.float64)
+    
+    reported_cumsum = np.concatenate(([0], np.cumsum(np.bincount(slots, minlength=slot_count))))
+    idle_cumsum = np.concatenate(([0], np.cumsum(np.bincount(slots, weights=~active_mask, minlength=slot_count))))
+    reported = reported_cumsum[window_slots:] - reported_cumsum[:-window_slots]
+    idle = idle_cumsum[window_slots:] - idle_cumsum[:-window_slots]
+    has_data = reported > 0
+    return idle[has_data] / reported[has_data]
 
-def calculate_idle_percentage(metrics: Dict[str, List[Dict]]) -> Dict[str, Any]:
+def calculate_idle_percentage(metrics: Dict[str, MetricSeries]) -> Dict[str, Any]:
     """
     计算空闲时间百分比
     
     Args:
-        metrics: CloudWatch指标数据字典
+        metrics: CloudWatch指标时间序列字典
         
     Returns:
         包含分析结果的字典
     """
     print("🔍 开始分析活跃状态...")
     
-    # 预定义活跃规则 - 只关注真正的业务活动指标
-    # 网络流量不作为判断依据，因为系统维护、监控等会产生持续的基础网络流量
-    activity_rules = {
-        'ReadIOPS': lambda x: x > 0,
-        'WriteIOPS': lambda x: x > 0,
-        'DatabaseConnections': lambda x: x > 0,
-        # 移除网络流量指标，避免误判
-        # 'NetworkReceiveThroughput': lambda x: x > 1024,
-        # 'NetworkTransmitThroughput': lambda x: x > 1024
-    }
+    # 收集所有时间戳（与已合并结果相同的序列直接跳过，避免重复排序去重）
+    all_timestamps = np.empty(0, dtype='datetime64[s]')
+    for series in metrics.values():
+        if not np.array_equal(series.timestamps, all_timestamps):
+            all_timestamps = np.union1d(all_timestamps, series.timestamps)
     
-    # 收集所有时间戳
-    all_timestamps = set()
-    for metric_name, metric_data in metrics.items():
-        for point in metric_data:
-            all_timestamps.add(point['Timestamp'])
-    
-    if not all_timestamps:
+    if all_timestamps.size == 0:
         print("❌ 没有找到任何数据点")
         return {
             'idle_percentage': 0.0,
@@ -1095,50 +1602,61 @@ def calculate_idle_percentage(metrics: Dict[str, List[Dict]]) -> Dict[str, Any]:
             'active_points': 0,
             'idle_points': 0,
             'analysis_period': None,
-            'activity_breakdown': {}
+            'activity_breakdown': {},
+            'rolling_idle_range': None
         }
     
-    # 按时间排序
-    sorted_timestamps = sorted(all_timestamps)
-    total_count = len(sorted_timestamps)
-    active_count = 0
-    
-    # 统计各指标的活跃次数
-    activity_breakdown = {metric: 0 for metric in activity_rules.keys()}
+    total_count = int(all_timestamps.size)
     
     print(f"   分析 {total_count} 个时间点...")
     
-    for i, timestamp in enumerate(sorted_timestamps):
-        is_active = False
-        active_metrics = []
-        
-        # 检查每个指标在该时间点的值
-        for metric_name, rule in activity_rules.items():
-            if metric_name in metrics:
-                value = get_value_at_timestamp(metrics[metric_name], timestamp)
-                
-                if rule(value):
-                    is_active = True
-                    active_metrics.append(f"{metric_name}={value:.2f}")
-                    activity_breakdown[metric_name] += 1
-        
-        if is_active:
-            active_count += 1
-            
-        # 显示进度条（每处理50个点更新一次）
-        if (i + 1) % 50 == 0 or (i + 1) == total_count:
-            print_progress_bar(i + 1, total_count, "   分析进度:")
+    # 对每个指标一次性求出所有时间点的取值，大于0即为活跃（含服务端合并的活跃标记）
+    active_mask = None
+    activity_breakdown = {}
+    for metric_name in ACTIVITY_METRICS + (ACTIVITY_SERIES_NAME,):
+        if metric_name in metrics:
+            series = metrics[metric_name]
+            # 各指标通常在相同时间点采样，此时取值已与全部时间点对齐，无需再查找
+            if np.array_equal(series.timestamps, all_timestamps):
+                metric_values = series.values
+            else:
+                # 获取数据时时间戳已按采样间隔取整，缺失的时间点直接视为0，不再借用相邻点的取值
+                metric_values = _values_at_timestamps(*series, all_timestamps, tolerance_seconds=0)
+            metric_active = metric_values > 0
+            # 服务端合并的活跃标记不是单个指标，不计入各指标活跃统计
+            if metric_name != ACTIVITY_SERIES_NAME:
+                activity_breakdown[metric_name] = int(np.count_nonzero(metric_active))
+            # 各指标的统计已先行完成，第一个指标的掩码直接作为合并结果原地累积
+            if active_mask is None:
+                active_mask = metric_active
+            else:
+                active_mask |= metric_active
+    
+    if active_mask is None:
+        active_mask = np.zeros(total_count, dtype=bool)
+    
+    active_count = int(np.count_nonzero(active_mask))
+    print_progress_bar(total_count, total_count, "   分析进度:")
     
     idle_count = total_count - active_count
     idle_percentage = (idle_count / total_count) * 100 if total_count > 0 else 0.0
     
+    # 滚动1小时空闲率的范围（按时间划分窗口，数据缺口不会把相隔很远的时间点并入同一窗口）
+    rolling_idle_range = None
+    if total_count > 1:
+        sample_interval = np.median(np.diff(all_timestamps))
+        rolling = rolling_idle_fraction(all_timestamps, active_mask, np.timedelta64(1, 'h'), sample_interval)
+        if rolling.size:
+            rolling_idle_range = (float(rolling.min()) * 100, float(rolling.max()) * 100)
+    
     analysis_result = {
         'idle_percentage': idle_percentage,
         'total_points': total_count,
         'active_points': active_count,
         'idle_points': idle_count,
-        'analysis_period': (sorted_timestamps[0], sorted_timestamps[-1]),
-        'activity_breakdown': activity_breakdown
+        'analysis_period': (to_datetime(all_timestamps[0]), to_datetime(all_timestamps[-1])),
+        'activity_breakdown': activity_breakdown,
+        'rolling_idle_range': rolling_idle_range
     }
     
     print(f"✓ 活跃状态分析完成")
@@ -1147,10 +1665,11 @@ def calculate_idle_percentage(metrics: Dict[str, List[Dict]]) -> Dict[str, Any]:
     print(f"   空闲时间点: {idle_count} ({idle_percentage:.1f}%)")
     
     # 显示各指标的活跃统计
-    print(f"   各指标活跃统计:")
-    for metric, count in activity_breakdown.items():
-        percentage = (count / total_count * 100) if total_count > 0 else 0
-        print(f"     {metric}: {count} 次 ({percentage:.1f}%)")
+    if activity_breakdown:
+        print(f"   各指标活跃统计:")
+        for metric, count in activity_breakdown.items():
+            percentage = (count / total_count * 100) if total_count > 0 else 0
+            print(f"     {metric}: {count} 次 ({percentage:.1f}%)")
     
     return analysis_result
 
@@ -1166,8 +1685,8 @@ def get_cluster_info(cluster_id: str, region: str) -> Dict[str, Any]:
         集群信息字典
     """
     try:
-        redshift = boto3.client('redshift', region_name=region)
-        response = redshift.describe_clusters(ClusterIdentifier=cluster_id)
+        # 复用验证阶段的describe_clusters结果，不再重复调用API
+        response = _describe_cluster(cluster_id, region)
         
         if not response['Clusters']:
             raise ValueError(f"未找到集群: {cluster_id}")
@@ -1205,13 +1724,13 @@ def estimate_monthly_cost(node_type: str, number_of_nodes: int, region: str) ->
     hourly_cost = price_info['price']
     price_source = price_info['source']
     
-    if price_source == 'hardcoded' and node_type not in ['dc2.large', 'dc2.8xlarge', 'ra3.large', 'ra3.xlplus', 'ra3.4xlarge', 'ra3.16xlarge']:
+    if price_source == 'hardcoded' and node_type not in _FALLBACK_INSTANCE_US:
         print(f"⚠️  未知实例类型 {node_type}，使用 ra3.xlplus 价格估算")
     
     print(f"   实例价格: {hourly_cost}/小时 (来源: {price_source})")
     
     total_hourly_cost = hourly_cost * number_of_nodes
-    monthly_cost = total_hourly_cost * 24 * 30  # 假设30天
+    monthly_cost = total_hourly_cost * HOURS_PER_MONTH
     
     return monthly_cost
 
@@ -1246,7 +1765,7 @@ def calculate_rpu_requirement(node_type: str, number_of_nodes: int) -> int:
     required_rpu = equivalent_xlplus / 0.5  # 等效于 equivalent_xlplus * 2
     
     # RPU必须是8的倍数，且最小为8
-    rpu_units = max(8, int((required_rpu + 7) // 8) * 8)  # 向上取整到8的倍数
+    rpu_units = max(8, ((int(required_rpu) + 7) // 8) * 8)  # 向上取整到8的倍数
     
     return rpu_units
 
@@ -1292,15 +1811,15 @@ def calculate_cost_savings(cluster_id: str, region: str, idle_percentage: float,
     print(f"   RPU价格: {currency_symbol}{rpu_hourly_cost}/小时 (来源: {price_source})")
     
     # Serverless成本 = RPU数量 × 小时费率 × 活跃时间
-    serverless_hourly_cost = required_rpu * rpu_hourly_cost
-    serverless_monthly_cost = serverless_hourly_cost * 24 * 30 * (active_percentage / 100)
+    serverless_full_month_cost = required_rpu * rpu_hourly_cost * HOURS_PER_MONTH
+    serverless_monthly_cost = serverless_full_month_cost * (active_percentage / 100)
     
     # 计算节省
     potential_savings = current_monthly_cost - serverless_monthly_cost
     savings_percentage = (potential_savings / current_monthly_cost) * 100 if current_monthly_cost > 0 else 0
     
     # 计算盈亏平衡点
-    break_even_usage_percentage = (current_monthly_cost / (serverless_hourly_cost * 24 * 30)) * 100
+    break_even_usage_percentage = (current_monthly_cost / serverless_full_month_cost) * 100
     
     cost_analysis = {
         'current_monthly_cost': current_monthly_cost,
@@ -1369,6 +1888,24 @@ def main():
         help='运行内置测试套件'
     )
     
+    parser.add_argument(
+        '--metric-math',
+        action='store_true',
+        help='使用CloudWatch Metric Math在服务端合并指标判断活跃状态（减少数据传输，不输出各指标活跃统计）'
+    )
+    
+    parser.add_argument(
+        '--refresh-prices',
+        action='store_true',
+        help='忽略本地价格缓存，重新从Pricing API查询价格'
+    )
+    
+    parser.add_argument(
+        '--offline-pricing',
+        action='store_true',
+        help='不调用Pricing API，直接使用内置备用价格'
+    )
+    
     args = parser.parse_args()
     
     # 如果是测试模式，运行测试并退出
@@ -1381,6 +1918,11 @@ def main():
     if not args.cluster_id:
         parser.error("--cluster-id is required (except in test mode)")
     
+    if args.refresh_prices:
+        clear_price_cache()
+    if args.offline_pricing:
+        set_pricing_offline(True)
+    
     try:
         # 验证输入参数
         validate_inputs(args.cluster_id, args.region, args.days)
@@ -1404,7 +1946,8 @@ def main():
         print("-" * 50)
         
         # 获取CloudWatch指标数据
-        metrics = safe_get_metrics(args.cluster_id, args.region, args.days)
+        metrics = safe_get_metrics(args.cluster_id, args.region, args.days, 
+                                   server_side_activity=args.metric_math)
         
         # 检查数据质量
         data_quality = check_data_availability(metrics)
@@ -1427,11 +1970,14 @@ def main():
         
         # 显示数据获取摘要
         print(f"\n📈 数据获取摘要:")
-        for metric_name, datapoints in metrics.items():
-            if datapoints:
-                first_time = datapoints[0]['Timestamp'].strftime('%Y-%m-%d %H:%M')
-                last_time = datapoints[-1]['Timestamp'].strftime('%Y-%m-%d %H:%M')
-                print(f"   {metric_name}: {len(datapoints)} 个数据点 ({first_time} ~ {last_time})")
+        for metric_name, series in metrics.items():
+            if len(series.values):
+                # 直接格式化datetime64，无需先转换为datetime
+                first_time, last_time = (
+                    text.replace('T', ' ') 
+                    for text in np.datetime_as_string(series.timestamps[[0, -1]], unit='m')
+                )
+                print(f"   {metric_name}: {len(series.values)} 个数据点 ({first_time} ~ {last_time})")
             else:
                 print(f"   {metric_name}: 无数据")
         